@@ -1,165 +1,309 @@
 """Модуль для автоматического обновления цен и остатков товаров на Яндекс Маркете."""
+import asyncio
+import dataclasses
 import datetime
+import functools
 import logging.config
+import shelve
+import threading
 from environs import Env
 from seller import download_stock
 
+import aiohttp
+import orjson
 import requests
 
-from seller import divide, price_conversion
+from seller import create_session, divide, gather_or_cancel
+from seller import gather_with_limit
+from seller import MAX_CONCURRENT_REQUESTS, RETRY_STATUSES
+from seller import prices_conversion, request_json
+from seller import send_request, stock_conversion
 
 logger = logging.getLogger(__file__)
 
+MARKET_API_URL = "https://api.partner.market.yandex.ru/"
+# Ограничения Яндекс Маркета на число записей в запросе обновления.
+STOCKS_BATCH_SIZE = 2000
+PRICES_BATCH_SIZE = 500
+MARKET_HEADERS = {
+    "Content-Type": "application/json",
+    "Accept": "application/json",
+    "Host": "api.partner.market.yandex.ru",
+}
+# Яндекс Маркет сообщает о превышении лимита запросов статусом 420.
+MARKET_RETRY_STATUSES = RETRY_STATUSES | {420}
+PAGES_CACHE_PATH = ".apicache"
+# Кэш открывается из рабочих потоков, а shelve не поддерживает
+# одновременную запись.
+PAGES_CACHE_LOCK = threading.Lock()
+
+
+@dataclasses.dataclass
+class YandexClient:
+    """Параметры доступа к API Яндекс Маркета для одной кампании.
+
+    Заголовок авторизации и адреса методов API кампании
+    формируются один раз при создании клиента.
+
+    Attributes:
+        session (aiohttp.ClientSession): HTTP-сессия для запросов к API.
+        campaign_id (str): Идентификатор кампании на Яндекс Маркете.
+        access_token (str): Токен доступа для авторизации в API.
+        limiter (asyncio.Semaphore): Ограничение одновременных запросов,
+            общее для кампаний с одним токеном.
+        headers (dict): Заголовок авторизации для запросов к API.
+        offer_mapping_url (str): Адрес списка товаров кампании.
+        stocks_url (str): Адрес обновления остатков.
+        prices_url (str): Адрес обновления цен.
+
+    Examples:
+        >>> async with create_session(MARKET_HEADERS) as session:
+        ...     client = YandexClient(session, "12345", "valid_token")
+        >>> client.stocks_url
+        'https://api.partner.market.yandex.ru/campaigns/12345/offers/stocks'
+    """
 
-def get_product_list(page, campaign_id, access_token):
+    session: aiohttp.ClientSession
+    campaign_id: str
+    access_token: str
+    limiter: asyncio.Semaphore = dataclasses.field(
+        default_factory=functools.partial(
+            asyncio.Semaphore, MAX_CONCURRENT_REQUESTS
+        ),
+        repr=False,
+    )
+    headers: dict = dataclasses.field(init=False)
+    offer_mapping_url: str = dataclasses.field(init=False)
+    stocks_url: str = dataclasses.field(init=False)
+    prices_url: str = dataclasses.field(init=False)
+
+    def __post_init__(self):
+        self.headers = {"Authorization": f"Bearer {self.access_token}"}
+        campaign_url = MARKET_API_URL + f"campaigns/{self.campaign_id}/"
+        self.offer_mapping_url = campaign_url + "offer-mapping-entries"
+        self.stocks_url = campaign_url + "offers/stocks"
+        self.prices_url = campaign_url + "offer-prices/updates"
+
+async def get_product_list(client, page, cached=None):
     """Получает список товаров с Яндекс Маркета для заданной кампании.
 
+    Если передан сохраненный ответ, страница запрашивается условно
+    и при ответе 304 Not Modified возвращается он же.
+
     Args:
+        client (YandexClient): Клиент API кампании.
         page (str): Токен страницы для пагинации.
-        campaign_id (str): Идентификатор кампании на Яндекс Маркете.
-        access_token (str): Токен доступа для авторизации в API.
+        cached (dict, optional): Сохраненная страница в формате
+            возвращаемого значения.
 
     Returns:
-        dict: Результат запроса с данными о товарах и пагинацией, содержащий:
-            "offerMappingEntries" (list): Список товаров,
-            "paging" (dict): Информация о пагинации.
+        dict: Страница каталога, содержащая:
+            "result" (dict): Результат запроса со списком товаров
+                "offerMappingEntries" и пагинацией "paging",
+            "validators" (dict): Заголовки условного запроса этой
+                страницы (см. get_validators).
 
     Raises:
-        requests.exceptions.HTTPError: Если запрос к API завершился ошибкой.
+        aiohttp.ClientResponseError: Если запрос к API завершился ошибкой.
 
     Examples:
-        >>> get_product_list("", "12345", "valid_token")
-        {'offerMappingEntries': [{'offer': {'shopSku': 'ABC123'}}],
-         'paging': {'nextPageToken': 'abc'}}
-        >>> get_product_list("", "12345", "invalid_token")
+        >>> await get_product_list(client, "")
+        {'result': {'offerMappingEntries': [{'offer': {'shopSku': 'ABC123'}}],
+                    'paging': {'nextPageToken': 'abc'}},
+         'validators': {'If-None-Match': '"p0"'}}
+        >>> await get_product_list(
+        ...     YandexClient(session, "12345", "invalid_token"), ""
+        ... )
         Traceback (most recent call last):
             ...
-        requests.exceptions.HTTPError: 401 Client Error: Unauthorized
+        aiohttp.ClientResponseError: 401, message='Unauthorized'
     """
-    endpoint_url = "https://api.partner.market.yandex.ru/"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {access_token}",
-        "Accept": "application/json",
-        "Host": "api.partner.market.yandex.ru",
-    }
     payload = {
         "page_token": page,
         "limit": 200,
     }
-    url = endpoint_url + f"campaigns/{campaign_id}/offer-mapping-entries"
-    response = requests.get(url, headers=headers, params=payload)
-    response.raise_for_status()
-    response_object = response.json()
-    return response_object.get("result")
+    headers = client.headers
+    if cached:
+        headers = {**headers, **cached["validators"]}
+    status, response_headers, body = await send_request(
+        client.session, "GET", client.offer_mapping_url,
+        headers=headers, params=payload, limiter=client.limiter,
+        retry_statuses=MARKET_RETRY_STATUSES,
+    )
+    if status == 304 and cached:
+        return cached
+    return {
+        "result": orjson.loads(body).get("result"),
+        "validators": get_validators(response_headers),
+    }
+
+
+def get_validators(headers):
+    """Формирует заголовки условного запроса по заголовкам ответа.
+
+    Args:
+        headers (Mapping): Заголовки ответа API.
+
+    Returns:
+        dict: Заголовки If-None-Match и/или If-Modified-Since.
+            Пустой словарь, если API не вернул ETag и Last-Modified.
+
+    Examples:
+        >>> get_validators({"ETag": '"abc"'})
+        {'If-None-Match': '"abc"'}
+        >>> get_validators({})
+        {}
+    """
+    validators = {}
+    if headers.get("ETag"):
+        validators["If-None-Match"] = headers["ETag"]
+    if headers.get("Last-Modified"):
+        validators["If-Modified-Since"] = headers["Last-Modified"]
+    return validators
+
+
+def load_cached_pages(key):
+    """Читает сохраненные страницы каталога кампании.
+
+    Args:
+        key (str): Ключ кампании в PAGES_CACHE_PATH.
+
+    Returns:
+        dict: Страницы каталога по токенам страниц.
+            Пустой словарь, если страницы не сохранялись.
+
+    Examples:
+        >>> load_cached_pages(client.offer_mapping_url)
+        {'': {'result': {...}, 'validators': {'If-None-Match': '"p0"'}}}
+    """
+    with PAGES_CACHE_LOCK, shelve.open(PAGES_CACHE_PATH) as cache:
+        return cache.get(key, {})
+
+
+def save_cached_pages(key, pages):
+    """Заменяет сохраненные страницы каталога кампании.
+
+    Страницы прошлого запуска удаляются целиком, поэтому кэш хранит
+    не больше одной версии каталога на кампанию.
+
+    Args:
+        key (str): Ключ кампании в PAGES_CACHE_PATH.
+        pages (dict): Страницы каталога по токенам страниц.
+
+    Examples:
+        >>> save_cached_pages(client.offer_mapping_url, {})
+    """
+    with PAGES_CACHE_LOCK, shelve.open(PAGES_CACHE_PATH) as cache:
+        cache[key] = pages
 
 
-def update_stocks(stocks, campaign_id, access_token):
+async def update_stocks(client, stocks):
     """Обновляет остатки товаров на Яндекс Маркете.
 
     Args:
+        client (YandexClient): Клиент API кампании.
         stocks (list): Список словарей с данными об остатках,
         где каждый словарь содержит:
             "sku" (str): Артикул товара,
             "warehouseId" (str): ID склада,
             "items" (list): Список с информацией о количестве.
-        campaign_id (str): Идентификатор кампании на Яндекс Маркете.
-        access_token (str): Токен доступа для авторизации в API.
 
     Returns:
         dict: Ответ API с результатом обновления.
 
     Raises:
-        requests.exceptions.HTTPError: Если запрос к API завершился ошибкой.
+        aiohttp.ClientResponseError: Если запрос к API завершился ошибкой.
 
     Examples:
-        >>> update_stocks([{"sku": "ABC123",
-        ...               "warehouseId": "WH1",
-        ...               "items": [{"count": 10, "type": "FIT",
-        ...                         "updatedAt": "2023-...Z"}]}],
-        ...               "12345", "valid_token")
+        >>> await update_stocks(client,
+        ...                     [{"sku": "ABC123",
+        ...                       "warehouseId": "WH1",
+        ...                       "items": [{"count": 10, "type": "FIT",
+        ...                                 "updatedAt": "2023-...Z"}]}])
         {'status': 'OK', 'result': [...]}
     """
-    endpoint_url = "https://api.partner.market.yandex.ru/"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {access_token}",
-        "Accept": "application/json",
-        "Host": "api.partner.market.yandex.ru",
-    }
     payload = {"skus": stocks}
-    url = endpoint_url + f"campaigns/{campaign_id}/offers/stocks"
-    response = requests.put(url, headers=headers, json=payload)
-    response.raise_for_status()
-    response_object = response.json()
-    return response_object
+    return await request_json(
+        client.session, "PUT", client.stocks_url,
+        headers=client.headers, json=payload, limiter=client.limiter,
+        retry_statuses=MARKET_RETRY_STATUSES,
+    )
 
 
-def update_price(prices, campaign_id, access_token):
+async def update_price(client, prices):
     """Обновляет цены товаров на Яндекс Маркете.
 
     Args:
+        client (YandexClient): Клиент API кампании.
         prices (list): Список словарей с данными о ценах,
         где каждый словарь содержит:
             "id" (str): Артикул товара,
             "price" (dict): Словарь с ключами "value" (int)
                 и "currencyId" (str).
-        campaign_id (str): Идентификатор кампании на Яндекс Маркете.
-        access_token (str): Токен доступа для авторизации в API.
 
     Returns:
         dict: Ответ API с результатом обновления.
 
     Raises:
-        requests.exceptions.HTTPError: Если запрос к API завершился ошибкой.
+        aiohttp.ClientResponseError: Если запрос к API завершился ошибкой.
 
     Examples:
-        >>> update_price([{"id": "ABC123",
-        ...              "price": {"value": 5990,
-        ...              "currencyId": "RUR"}}],
-        ...              "12345", "valid_token")
+        >>> await update_price(client,
+        ...                    [{"id": "ABC123",
+        ...                      "price": {"value": 5990,
+        ...                      "currencyId": "RUR"}}])
         {'status': 'OK', ...}
     """
-    endpoint_url = "https://api.partner.market.yandex.ru/"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {access_token}",
-        "Accept": "application/json",
-        "Host": "api.partner.market.yandex.ru",
-    }
     payload = {"offers": prices}
-    url = endpoint_url + f"campaigns/{campaign_id}/offer-prices/updates"
-    response = requests.post(url, headers=headers, json=payload)
-    response.raise_for_status()
-    response_object = response.json()
-    return response_object
+    return await request_json(
+        client.session, "POST", client.prices_url,
+        headers=client.headers, json=payload, limiter=client.limiter,
+        retry_statuses=MARKET_RETRY_STATUSES,
+    )
 
 
-def get_offer_ids(campaign_id, market_token):
+async def get_offer_ids(client):
     """Получает артикулы товаров с Яндекс Маркета.
 
+    Следующая страница запрашивается сразу после получения
+    nextPageToken, пока обрабатывается текущая.
+    Страницы запрашиваются условно по ответам прошлого запуска,
+    сохраненным в PAGES_CACHE_PATH.
+
     Args:
-        campaign_id (str): Идентификатор кампании на Яндекс Маркете.
-        market_token (str): Токен доступа для авторизации в API.
+        client (YandexClient): Клиент API кампании.
 
     Returns:
         list: Список строк с артикулами товаров (shopSku).
 
     Raises:
-        requests.exceptions.HTTPError: Если запрос к API завершился ошибкой.
+        aiohttp.ClientResponseError: Если запрос к API завершился ошибкой.
 
     Examples:
-        >>> get_offer_ids("12345", "valid_token")
+        >>> await get_offer_ids(YandexClient(session, "12345", "valid_token"))
         ['ABC123', 'DEF456', ...]
     """
-    page = ""
+    cache_key = client.offer_mapping_url
+    cached_pages = await asyncio.to_thread(load_cached_pages, cache_key)
+    pages = {}
     product_list = []
-    while True:
-        some_prod = get_product_list(page, campaign_id, market_token)
-        product_list.extend(some_prod.get("offerMappingEntries"))
+    page = ""
+    next_page = asyncio.create_task(
+        get_product_list(client, page, cached_pages.get(page))
+    )
+    while next_page:
+        entry = await next_page
+        if entry["validators"]:
+            pages[page] = entry
+        some_prod = entry["result"]
         page = some_prod.get("paging").get("nextPageToken")
-        if not page:
-            break
+        next_page = None
+        if page:
+            next_page = asyncio.create_task(
+                get_product_list(client, page, cached_pages.get(page))
+            )
+        product_list.extend(some_prod.get("offerMappingEntries"))
+    await asyncio.to_thread(save_cached_pages, cache_key, pages)
     offer_ids = []
     for product in product_list:
         offer_ids.append(product.get("offer").get("shopSku"))
@@ -173,63 +317,70 @@ def create_stocks(watch_remnants, offer_ids, warehouse_id):
     добавляя недостающие товары с нулевым остатком.
 
     Args:
-        watch_remnants (list):
-        Список словарей с данными об остатках из источника,
-            где каждый словарь содержит:
+        watch_remnants (pandas.DataFrame):
+        Таблица с данными об остатках из источника,
+            содержащая столбцы:
                 "Код" (str): Артикул товара,
                 "Количество" (str): Количество товара.
         offer_ids (list): Список строк с артикулами товаров с Яндекс Маркета.
         warehouse_id (str): Идентификатор склада.
 
     Returns:
-        list: Список словарей с данными об остатках в формате API.
+        tuple: Кортеж из двух списков словарей с данными об остатках
+            в формате API: все остатки и ненулевые остатки.
 
     Examples:
-        >>> create_stocks([{"Код": "ABC123", "Количество": "5"}],
+        >>> create_stocks(pd.DataFrame([{"Код": "ABC123", "Количество": "5"}]),
         ...               ["ABC123"], "WH1")
-        [{'sku': 'ABC123', 'warehouseId': 'WH1',
-        'items': [{'count': 5, 'type': 'FIT', ...}]}]
+        ([{'sku': 'ABC123', 'warehouseId': 'WH1',
+        'items': [{'count': 5, 'type': 'FIT', ...}]}],
+         [{'sku': 'ABC123', 'warehouseId': 'WH1',
+        'items': [{'count': 5, 'type': 'FIT', ...}]}])
     """
     stocks = list()
-    date = str(datetime.datetime.utcnow().replace(microsecond=0).isoformat() + "Z")
-    for watch in watch_remnants:
-        if str(watch.get("Код")) in offer_ids:
-            count = str(watch.get("Количество"))
-            if count == ">10":
-                stock = 100
-            elif count == "1":
-                stock = 0
-            else:
-                stock = int(watch.get("Количество"))
-            stocks.append(
-                {
-                    "sku": str(watch.get("Код")),
-                    "warehouseId": warehouse_id,
-                    "items": [
-                        {
-                            "count": stock,
-                            "type": "FIT",
-                            "updatedAt": date,
-                        }
-                    ],
-                }
-            )
-            offer_ids.remove(str(watch.get("Код")))
-    for offer_id in offer_ids:
-        stocks.append(
-            {
-                "sku": offer_id,
-                "warehouseId": warehouse_id,
-                "items": [
-                    {
-                        "count": 0,
-                        "type": "FIT",
-                        "updatedAt": date,
-                    }
-                ],
-            }
-        )
-    return stocks
+    not_empty = list()
+    now = datetime.datetime.now(datetime.timezone.utc)
+    date = now.strftime("%Y-%m-%dT%H:%M:%SZ")
+    # Список items одинаков для всех нулевых остатков, поэтому создается
+    # один раз и используется во всех таких записях.
+    zero_items = [{"count": 0, "type": "FIT", "updatedAt": date}]
+    remaining = set(offer_ids)
+    codes = watch_remnants["Код"]
+    matched = codes.isin(remaining) & ~codes.duplicated()
+    counts = stock_conversion(
+        watch_remnants.loc[matched, "Количество"], codes[matched]
+    )
+    for code, stock in zip(codes[matched].tolist(), counts.tolist()):
+        if stock == 0:
+            stocks.append(stock_record(code, warehouse_id, zero_items))
+            continue
+        items = [{"count": stock, "type": "FIT", "updatedAt": date}]
+        record = stock_record(code, warehouse_id, items)
+        stocks.append(record)
+        not_empty.append(record)
+    for offer_id in remaining.difference(codes[matched]):
+        stocks.append(stock_record(offer_id, warehouse_id, zero_items))
+    return stocks, not_empty
+
+
+def stock_record(sku, warehouse_id, items):
+    """Формирует запись об остатке товара в формате API Яндекс Маркета.
+
+    Args:
+        sku (str): Артикул товара.
+        warehouse_id (str): Идентификатор склада.
+        items (list): Список с информацией о количестве.
+
+    Returns:
+        dict: Запись об остатке для метода обновления остатков.
+
+    Examples:
+        >>> stock_record("ABC123", "WH1", [{"count": 5, "type": "FIT",
+        ...                                 "updatedAt": "2023-...Z"}])
+        {'sku': 'ABC123', 'warehouseId': 'WH1',
+        'items': [{'count': 5, 'type': 'FIT', 'updatedAt': '2023-...Z'}]}
+    """
+    return {"sku": sku, "warehouseId": warehouse_id, "items": items}
 
 
 def create_prices(watch_remnants, offer_ids):
@@ -238,8 +389,8 @@ def create_prices(watch_remnants, offer_ids):
     Преобразует данные о ценах из источника в формат API Яндекс Маркета.
 
     Args:
-        watch_remnants (list): Список словарей с данными о ценах из источника,
-            где каждый словарь содержит:
+        watch_remnants (pandas.DataFrame): Таблица с данными о ценах
+            из источника, содержащая столбцы:
                 "Код" (str): Артикул товара,
                 "Цена" (str): Цена товара.
         offer_ids (list): Список строк с артикулами товаров с Яндекс Маркета.
@@ -248,105 +399,196 @@ def create_prices(watch_remnants, offer_ids):
         list: Список словарей с данными о ценах в формате API Яндекс Маркета.
 
     Examples:
-        >>> create_prices([{"Код": "ABC123", "Цена": "5990"}], ["ABC123"])
+        >>> create_prices(pd.DataFrame([{"Код": "ABC123", "Цена": "5990"}]),
+        ...               ["ABC123"])
         [{'id': 'ABC123', 'price': {'value': 5990, 'currencyId': 'RUR'}}]
-        >>> create_prices([], ["ABC123"])
+        >>> create_prices(pd.DataFrame(columns=["Код", "Цена"]), ["ABC123"])
         []
     """
     prices = []
-    for watch in watch_remnants:
-        if str(watch.get("Код")) in offer_ids:
-            price = {
-                "id": str(watch.get("Код")),
-                # "feed": {"id": 0},
-                "price": {
-                    "value": int(price_conversion(watch.get("Цена"))),
-                    # "discountBase": 0,
-                    "currencyId": "RUR",
-                    # "vat": 0,
-                },
-                # "marketSku": 0,
-                # "shopSku": "string",
-            }
-            prices.append(price)
+    codes = watch_remnants["Код"]
+    matched = codes.isin(set(offer_ids))
+    values = prices_conversion(watch_remnants.loc[matched, "Цена"]).astype(int)
+    for code, value in zip(codes[matched].tolist(), values.tolist()):
+        price = {
+            "id": code,
+            # "feed": {"id": 0},
+            "price": {
+                "value": value,
+                # "discountBase": 0,
+                "currencyId": "RUR",
+                # "vat": 0,
+            },
+            # "marketSku": 0,
+            # "shopSku": "string",
+        }
+        prices.append(price)
     return prices
 
 
-async def upload_prices(watch_remnants, campaign_id, market_token):
+async def upload_prices(client, watch_remnants, offer_ids=None):
     """Асинхронно обновляет цены товаров на Яндекс Маркете.
 
-    Получает артикулы, формирует цены и отправляет их частями по 500 записей.
+    Получает артикулы, формирует цены в отдельном потоке, чтобы
+    не блокировать другие запросы, и отправляет их частями
+    по PRICES_BATCH_SIZE (500) записей. Одновременно выполняется
+    не более MAX_CONCURRENT_REQUESTS запросов под токеном клиента.
 
     Args:
-        watch_remnants (list): Список словарей с данными о товарах из источника.
-        campaign_id (str): Идентификатор кампании на Яндекс Маркете.
-        market_token (str): Токен доступа для авторизации в API.
+        client (YandexClient): Клиент API кампании.
+        watch_remnants (pandas.DataFrame): Таблица с данными о товарах
+            из источника.
+        offer_ids (list, optional): Артикулы товаров с Яндекс Маркета.
+            Если не переданы, запрашиваются у API.
 
     Returns:
         list: Список сформированных данных о ценах.
 
     Raises:
-        requests.exceptions.HTTPError: Если запрос к API завершился ошибкой.
+        aiohttp.ClientResponseError: Если запрос к API завершился ошибкой.
 
     Examples:
-        >>> await upload_prices([{"Код": "ABC123", "Цена": "5'990.00 руб."}],
-        ...                     "12345", "valid_token")
+        >>> await upload_prices(client,
+        ...                     pd.DataFrame([{"Код": "ABC123",
+        ...                                    "Цена": "5'990.00 руб."}]))
         [{'id': 'ABC123', 'price': {'value': 5990, 'currencyId': 'RUR'}}]
-        >>> await upload_prices([], "12345", "valid_token")
+        >>> await upload_prices(client, pd.DataFrame(columns=["Код", "Цена"]))
         []
     """
-    offer_ids = get_offer_ids(campaign_id, market_token)
-    prices = create_prices(watch_remnants, offer_ids)
-    for some_prices in list(divide(prices, 500)):
-        update_price(some_prices, campaign_id, market_token)
+    if offer_ids is None:
+        offer_ids = await get_offer_ids(client)
+    prices = await asyncio.to_thread(
+        create_prices, watch_remnants, offer_ids
+    )
+    await gather_with_limit(
+        update_price(client, some_prices)
+        for some_prices in divide(prices, PRICES_BATCH_SIZE)
+    )
     return prices
 
 
-async def upload_stocks(watch_remnants, campaign_id, market_token, warehouse_id):
+async def upload_stocks(client, watch_remnants, warehouse_id, offer_ids=None):
     """Асинхронно обновляет остатки товаров на Яндекс Маркете.
 
-    Получает артикулы, формирует остатки, отправляет их частями по 2000 записей
-    и возвращает ненулевые и все остатки.
+    Получает артикулы, формирует остатки в отдельном потоке, чтобы
+    не блокировать другие запросы, отправляет их частями
+    по STOCKS_BATCH_SIZE (2000) записей и возвращает ненулевые и все
+    остатки. Одновременно выполняется не более MAX_CONCURRENT_REQUESTS
+    запросов под токеном клиента.
 
     Args:
-        watch_remnants (list): Список словарей с данными о товарах из источника.
-        campaign_id (str): Идентификатор кампании на Яндекс Маркете.
-        market_token (str): Токен доступа для авторизации в API.
+        client (YandexClient): Клиент API кампании.
+        watch_remnants (pandas.DataFrame): Таблица с данными о товарах
+            из источника.
         warehouse_id (str): Идентификатор склада.
+        offer_ids (list, optional): Артикулы товаров с Яндекс Маркета.
+            Если не переданы, запрашиваются у API.
 
     Returns:
         tuple: Кортеж из двух списков - ненулевые остатки и все остатки.
 
     Raises:
-        requests.exceptions.HTTPError: Если запрос к API завершился ошибкой.
+        aiohttp.ClientResponseError: Если запрос к API завершился ошибкой.
 
     Examples:
-        >>> await upload_stocks([{"Код": "ABC123", "Количество": "5"}],
-        ...                     "12345", "valid_token", "WH1")
+        >>> await upload_stocks(client,
+        ...                     pd.DataFrame([{"Код": "ABC123",
+        ...                                    "Количество": "5"}]),
+        ...                     "WH1")
         ([{'sku': 'ABC123', 'warehouseId': 'WH1', 'items': [{'count': 5, ...}]}],
          [{'sku': 'ABC123', 'warehouseId': 'WH1', 'items': [{'count': 5, ...}]}])
-        >>> await upload_stocks([], "12345", "valid_token", "WH1")
+        >>> await upload_stocks(client,
+        ...                     pd.DataFrame(columns=["Код", "Количество"]),
+        ...                     "WH1")
         ([], [])
     """
-    offer_ids = get_offer_ids(campaign_id, market_token)
-    stocks = create_stocks(watch_remnants, offer_ids, warehouse_id)
-    for some_stock in list(divide(stocks, 2000)):
-        update_stocks(some_stock, campaign_id, market_token)
-    not_empty = list(
-        filter(lambda stock: (stock.get("items")[0].get("count") != 0), stocks)
+    if offer_ids is None:
+        offer_ids = await get_offer_ids(client)
+    stocks, not_empty = await asyncio.to_thread(
+        create_stocks, watch_remnants, offer_ids, warehouse_id
+    )
+    await gather_with_limit(
+        update_stocks(client, some_stock)
+        for some_stock in divide(stocks, STOCKS_BATCH_SIZE)
     )
     return not_empty, stocks
 
 
+async def update_campaign(
+    client, watch_remnants, warehouse_id, offer_ids=None
+):
+    """Обновляет остатки и цены одной кампании на Яндекс Маркете.
+
+    Артикулы запрашиваются один раз, после чего остатки и цены
+    отправляются одновременно.
+
+    Args:
+        client (YandexClient): Клиент API кампании.
+        watch_remnants (pandas.DataFrame): Таблица с данными о товарах
+            из источника.
+        warehouse_id (str): Идентификатор склада.
+        offer_ids (list, optional): Артикулы товаров с Яндекс Маркета.
+            Если не переданы, запрашиваются у API.
+
+    Raises:
+        aiohttp.ClientResponseError: Если запрос к API завершился ошибкой.
+    """
+    if offer_ids is None:
+        offer_ids = await get_offer_ids(client)
+    await gather_or_cancel(
+        upload_stocks(client, watch_remnants, warehouse_id, offer_ids),
+        upload_prices(client, watch_remnants, offer_ids),
+    )
+
+
+async def update_campaigns(market_token, campaigns):
+    """Параллельно обновляет остатки и цены нескольких кампаний.
+
+    Кампании обрабатываются конкурентно в одной HTTP-сессии.
+    Файл остатков скачивается в отдельном потоке, пока
+    запрашиваются артикулы кампаний.
+
+    Args:
+        market_token (str): Токен доступа для авторизации в API.
+        campaigns (list): Список пар (campaign_id, warehouse_id).
+
+    Raises:
+        aiohttp.ClientResponseError: Если запрос к API завершился ошибкой.
+        requests.exceptions.RequestException: Если загрузка остатков
+            не удалась.
+    """
+    async with create_session(MARKET_HEADERS) as session:
+        # Все кампании работают под одним токеном, поэтому ограничение
+        # одновременных запросов у них общее.
+        limiter = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+        clients = [
+            YandexClient(session, campaign_id, market_token, limiter)
+            for campaign_id, _ in campaigns
+        ]
+        watch_remnants, *campaigns_offer_ids = await gather_or_cancel(
+            asyncio.to_thread(download_stock),
+            *(get_offer_ids(client) for client in clients),
+        )
+        await gather_or_cancel(
+            *(
+                update_campaign(client, watch_remnants, warehouse_id, offer_ids)
+                for client, (_, warehouse_id), offer_ids in zip(
+                    clients, campaigns, campaigns_offer_ids
+                )
+            )
+        )
+
+
 def main():
     """Основная функция для обновления цен и остатков на Яндекс Маркете.
 
     Выполняет обновление цен и остатков для кампаний FBS и DBS,
-    используя данные из источника watch_remnants.
+    используя данные об остатках из источника.
 
     Raises:
         requests.exceptions.ReadTimeout: Если превышено время ожидания запроса.
         requests.exceptions.ConnectionError: При ошибке соединения с API.
+        aiohttp.ClientConnectionError: При ошибке соединения с API.
         Exception: При прочих ошибках выполнения.
     """
     env = Env()
@@ -356,24 +598,18 @@ def main():
     warehouse_fbs_id = env.str("WAREHOUSE_FBS_ID")
     warehouse_dbs_id = env.str("WAREHOUSE_DBS_ID")
 
-    watch_remnants = download_stock()
+    campaigns = [
+        (campaign_fbs_id, warehouse_fbs_id),  # FBS
+        (campaign_dbs_id, warehouse_dbs_id),  # DBS
+    ]
     try:
-        # FBS
-        offer_ids = get_offer_ids(campaign_fbs_id, market_token)
-        stocks = create_stocks(watch_remnants, offer_ids, warehouse_fbs_id)
-        for some_stock in list(divide(stocks, 2000)):
-            update_stocks(some_stock, campaign_fbs_id, market_token)
-        upload_prices(watch_remnants, campaign_fbs_id, market_token)
-
-        # DBS
-        offer_ids = get_offer_ids(campaign_dbs_id, market_token)
-        stocks = create_stocks(watch_remnants, offer_ids, warehouse_dbs_id)
-        for some_stock in list(divide(stocks, 2000)):
-            update_stocks(some_stock, campaign_dbs_id, market_token)
-        upload_prices(watch_remnants, campaign_dbs_id, market_token)
-    except requests.exceptions.ReadTimeout:
+        asyncio.run(update_campaigns(market_token, campaigns))
+    except (requests.exceptions.ReadTimeout, asyncio.TimeoutError):
         print("Превышено время ожидания...")
-    except requests.exceptions.ConnectionError as error:
+    except (
+        requests.exceptions.ConnectionError,
+        aiohttp.ClientConnectionError,
+    ) as error:
         print(error, "Ошибка соединения")
     except Exception as error:
         print(error, "ERROR_2")
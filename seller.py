@@ -1,24 +1,319 @@
 """Модуль для автоматического обновления цен и остатков товаров на Ozon."""
+import asyncio
+import contextlib
+import dataclasses
+import email.utils
+import functools
 import io
 import logging.config
-import os
+import random
 import re
+import time
 import zipfile
 from environs import Env
 
+import aiohttp
+import numpy as np
+import orjson
 import pandas as pd
 import requests
 
 logger = logging.getLogger(__file__)
 
+OZON_API_URL = "https://api-seller.ozon.ru/"
+# Ограничения Ozon на количество записей в одном запросе обновления.
+STOCKS_BATCH_SIZE = 100
+PRICES_BATCH_SIZE = 1000
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RETRY_MAX_DELAY = 30
+# Максимальное количество одновременных запросов под одним токеном API.
+MAX_CONCURRENT_REQUESTS = 5
+# Дробная часть цены целиком или любой символ, кроме цифры.
+PRICE_JUNK_RE = re.compile(r"\..*|[^0-9]", re.DOTALL)
+# Количества в файле остатков, которые заменяются фиксированным остатком.
+STOCK_OVERRIDES = {">10": 100, "1": 0}
 
-def get_product_list(last_id, client_id, seller_token):
-    """Получает список товаров магазина с Ozon через API.
+
+def create_session(headers=None):
+    """Создает HTTP-сессию с пулом keep-alive соединений.
+
+    Все запросы к API выполняются через одну сессию,
+    чтобы не устанавливать TCP и TLS соединение заново для каждого запроса.
 
     Args:
-        last_id (str): Последний идентификатор для пагинации.
+        headers (dict, optional): Заголовки, которые добавляются
+            к каждому запросу сессии.
+
+    Returns:
+        aiohttp.ClientSession: Новая HTTP-сессия.
+
+    Examples:
+        >>> async with create_session() as session:
+        ...     await get_offer_ids(OzonClient(session, "12345", "token123"))
+        ['ABC123', 'XYZ789']
+    """
+    connector = aiohttp.TCPConnector(limit=20, keepalive_timeout=60)
+    return aiohttp.ClientSession(connector=connector, headers=headers)
+
+
+async def send_request(session, method, url, limiter=None,
+                       retry_statuses=RETRY_STATUSES, retries=5,
+                       backoff_factor=0.5, **kwargs):
+    """Выполняет запрос к API с повторными попытками.
+
+    При ответе со статусом из retry_statuses, обрыве соединения
+    или таймауте повторяет запрос с экспоненциально растущей паузой
+    (см. get_retry_delay), поэтому сбой одной части данных
+    не прерывает всю загрузку.
+    Каждая попытка выполняется под limiter, а пауза между попытками -
+    без него, чтобы ожидающий повтора запрос не занимал место.
+
+    Args:
+        session (aiohttp.ClientSession): HTTP-сессия для запросов к API.
+        method (str): HTTP-метод, например "GET" или "POST".
+        url (str): Адрес запроса.
+        limiter (asyncio.Semaphore, optional): Ограничение одновременных
+            запросов, общее для всех запросов под одним токеном.
+        retry_statuses (set): Статусы ответа, при которых запрос
+            повторяется. По умолчанию RETRY_STATUSES (429 и 5xx).
+        retries (int): Количество повторных попыток.
+        backoff_factor (float): Базовая пауза между попытками в секундах.
+        **kwargs: Параметры, передаваемые в aiohttp.ClientSession.request.
+
+    Returns:
+        tuple: Статус ответа, его заголовки и тело в байтах.
+
+    Raises:
+        aiohttp.ClientResponseError: Если запрос к API завершился ошибкой.
+        aiohttp.ClientConnectionError: Если соединение не удалось
+            после всех попыток.
+        asyncio.TimeoutError: Если превышено время ожидания
+            после всех попыток.
+
+    Examples:
+        >>> await send_request(session, "GET", "https://example.com/")
+        (200, <CIMultiDictProxy(...)>, b'...')
+    """
+    limiter = limiter or contextlib.nullcontext()
+    attempt = 0
+    while True:
+        try:
+            async with limiter, session.request(
+                method, url, **kwargs
+            ) as response:
+                if (response.status not in retry_statuses
+                        or attempt == retries):
+                    response.raise_for_status()
+                    body = await response.read()
+                    return response.status, response.headers, body
+                reason = response.status
+                retry_after = response.headers.get("Retry-After")
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as error:
+            if attempt == retries:
+                raise
+            reason = repr(error)
+            retry_after = None
+        delay = get_retry_delay(attempt, backoff_factor, retry_after)
+        logger.warning(
+            "%s %s: %s, повтор через %.1f с", method, url, reason, delay
+        )
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+async def request_json(session, method, url, json=None, **kwargs):
+    """Выполняет запрос к API и возвращает ответ в формате JSON.
+
+    Тело запроса кодируется и ответ разбирается с помощью orjson.
+    Запрос отправляется через send_request, поэтому временные сбои
+    API повторяются.
+
+    Args:
+        session (aiohttp.ClientSession): HTTP-сессия для запросов к API.
+        method (str): HTTP-метод, например "GET" или "POST".
+        url (str): Адрес запроса.
+        json (dict, optional): Тело запроса.
+        **kwargs: Параметры, передаваемые в send_request.
+
+    Returns:
+        dict: Ответ API в формате JSON.
+
+    Raises:
+        aiohttp.ClientResponseError: Если запрос к API завершился ошибкой.
+        aiohttp.ClientConnectionError: Если соединение не удалось
+            после всех попыток.
+        asyncio.TimeoutError: Если превышено время ожидания
+            после всех попыток.
+
+    Examples:
+        >>> await request_json(session, "POST",
+        ...                    "https://api-seller.ozon.ru/v2/product/list",
+        ...                    json={"limit": 1}, headers=headers)
+        {'result': {'items': [...], 'total': 1, 'last_id': 'xyz'}}
+    """
+    if json is not None:
+        kwargs["headers"] = {
+            **(kwargs.get("headers") or {}),
+            "Content-Type": "application/json",
+        }
+        kwargs["data"] = orjson.dumps(json)
+    _, _, body = await send_request(session, method, url, **kwargs)
+    return orjson.loads(body)
+
+
+def get_retry_delay(attempt, backoff_factor, retry_after=None):
+    """Вычисляет паузу перед повторной попыткой запроса.
+
+    Если API вернул заголовок Retry-After, он соблюдается полностью:
+    повтор раньше срока снова упрется в ограничение API.
+    Иначе пауза растет экспоненциально со случайной добавкой,
+    чтобы параллельные запросы не повторялись одновременно,
+    и не превышает RETRY_MAX_DELAY секунд.
+
+    Args:
+        attempt (int): Номер неудачной попытки, начиная с нуля.
+        backoff_factor (float): Базовая пауза в секундах.
+        retry_after (str, optional): Значение заголовка Retry-After:
+            число секунд или HTTP-дата.
+
+    Returns:
+        float: Пауза в секундах.
+
+    Examples:
+        >>> get_retry_delay(0, 0.5, "2")
+        2.0
+        >>> get_retry_delay(0, 0.5, "120")
+        120.0
+        >>> 2.0 <= get_retry_delay(2, 0.5) <= 2.5
+        True
+        >>> get_retry_delay(10, 0.5)
+        30
+    """
+    if retry_after:
+        try:
+            return max(float(retry_after), 0.0)
+        except ValueError:
+            pass
+        try:
+            retry_at = email.utils.parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            retry_at = None
+        if retry_at is not None:
+            return max(retry_at.timestamp() - time.time(), 0.0)
+    delay = backoff_factor * 2 ** attempt + random.uniform(0, backoff_factor)
+    return min(delay, RETRY_MAX_DELAY)
+
+
+async def gather_or_cancel(*aws):
+    """Выполняет корутины конкурентно, как asyncio.gather.
+
+    При первой ошибке оставшиеся задачи отменяются и дожидаются
+    завершения, после чего ошибка пробрасывается дальше, поэтому
+    после сбоя загрузки в API не уходят новые запросы.
+
+    Args:
+        *aws: Корутины или задачи для выполнения.
+
+    Returns:
+        list: Результаты в исходном порядке.
+
+    Raises:
+        Exception: Первая ошибка одной из корутин.
+
+    Examples:
+        >>> await gather_or_cancel(get_offer_ids(client),
+        ...                        asyncio.to_thread(download_stock))
+        [['ABC123', ...], <DataFrame>]
+    """
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+async def gather_with_limit(aws, limit=MAX_CONCURRENT_REQUESTS):
+    """Выполняет корутины конкурентно, ограничивая число одновременных.
+
+    Используется для отправки частей данных в API параллельно.
+    Корутины берутся из aws по мере освобождения обработчиков,
+    поэтому генератор частей не раскрывается целиком заранее.
+    При ошибке в одной части остальные обработчики отменяются
+    (см. gather_or_cancel).
+    Ограничение действует только внутри одного вызова: общее
+    ограничение запросов к API задает limiter клиента.
+
+    Args:
+        aws (iterable): Корутины для выполнения.
+        limit (int): Максимальное количество одновременно выполняемых корутин.
+
+    Returns:
+        list: Результаты корутин в исходном порядке.
+
+    Examples:
+        >>> await gather_with_limit(
+        ...     update_stocks(client, chunk) for chunk in divide(stocks, 100)
+        ... )
+        [{'result': [...]}, {'result': [...]}]
+    """
+    pending = enumerate(aws)
+    results = {}
+
+    async def worker():
+        for index, aw in pending:
+            results[index] = await aw
+
+    await gather_or_cancel(*(worker() for _ in range(limit)))
+    return [results[index] for index in range(len(results))]
+
+
+@dataclasses.dataclass
+class OzonClient:
+    """Параметры доступа к API Ozon для одного магазина.
+
+    Заголовки авторизации формируются один раз при создании клиента.
+
+    Attributes:
+        session (aiohttp.ClientSession): HTTP-сессия для запросов к API.
         client_id (str): Идентификатор клиента Ozon.
         seller_token (str): Токен API Ozon.
+        limiter (asyncio.Semaphore): Ограничение одновременных запросов
+            магазина, не более MAX_CONCURRENT_REQUESTS.
+        headers (dict): Заголовки авторизации для запросов к API.
+
+    Examples:
+        >>> async with create_session() as session:
+        ...     client = OzonClient(session, "12345", "token123")
+        >>> client.headers
+        {'Client-Id': '12345', 'Api-Key': 'token123'}
+    """
+
+    session: aiohttp.ClientSession
+    client_id: str
+    seller_token: str
+    limiter: asyncio.Semaphore = dataclasses.field(
+        default_factory=functools.partial(
+            asyncio.Semaphore, MAX_CONCURRENT_REQUESTS
+        ),
+        repr=False,
+    )
+    headers: dict = dataclasses.field(init=False)
+
+    def __post_init__(self):
+        self.headers = {
+            "Client-Id": self.client_id,
+            "Api-Key": self.seller_token,
+        }
+
+async def get_product_list(client, last_id):
+    """Получает список товаров магазина с Ozon через API.
+
+    Args:
+        client (OzonClient): Клиент API Ozon.
+        last_id (str): Последний идентификатор для пагинации.
 
     Returns:
         dict: Словарь с данными о товарах из ответа API, содержащий ключи:
@@ -27,17 +322,13 @@ def get_product_list(last_id, client_id, seller_token):
             "last_id" (str): Последний идентификатор для пагинации.
 
     Raises:
-        requests.exceptions.HTTPError: Если запрос к API завершился ошибкой.
+        aiohttp.ClientResponseError: Если запрос к API завершился ошибкой.
 
     Examples:
-        >>> get_product_list("", "12345", "token123")
+        >>> await get_product_list(client, "")
         {'items': [{'offer_id': 'ABC123', ...}], 'total': 1, 'last_id': 'xyz'}
     """
-    url = "https://api-seller.ozon.ru/v2/product/list"
-    headers = {
-        "Client-Id": client_id,
-        "Api-Key": seller_token,
-    }
+    url = OZON_API_URL + "v2/product/list"
     payload = {
         "filter": {
             "visibility": "ALL",
@@ -45,58 +336,62 @@ def get_product_list(last_id, client_id, seller_token):
         "last_id": last_id,
         "limit": 1000,
     }
-    response = requests.post(url, json=payload, headers=headers)
-    response.raise_for_status()
-    response_object = response.json()
+    response_object = await request_json(
+        client.session, "POST", url, json=payload, headers=client.headers,
+        limiter=client.limiter,
+    )
     return response_object.get("result")
 
 
-def get_offer_ids(client_id, seller_token):
+async def get_offer_ids(client):
     """Извлекает артикулы всех товаров магазина Ozon.
 
     Выполняет запросы к API Ozon с использованием пагинации,
     собирает все товары и возвращает список их артикулов
-    (offer_id).
+    (offer_id). Следующая страница запрашивается сразу после
+    получения курсора, пока обрабатывается текущая.
 
     Args:
-        client_id (str): Идентификатор клиента Ozon из переменных окружения.
-        seller_token (str): Токен API Ozon из переменных окружения.
+        client (OzonClient): Клиент API Ozon.
 
     Returns:
         list: Список строк с артикулами товаров.
 
     Raises:
-        requests.exceptions.HTTPError: Если запрос к API завершился ошибкой.
+        aiohttp.ClientResponseError: Если запрос к API завершился ошибкой.
 
     Examples:
-        >>> get_offer_ids("12345", "token123")
+        >>> await get_offer_ids(OzonClient(session, "12345", "token123"))
         ['ABC123', 'XYZ789']
-        >>> get_offer_ids("", "")
+        >>> await get_offer_ids(OzonClient(session, "", ""))
         Traceback (most recent call last):
             ...
-        requests.exceptions.HTTPError: 401 Client Error: Unauthorized
+        aiohttp.ClientResponseError: 401, message='Unauthorized'
     """
-    last_id = ""
     product_list = []
-    while True:
-        some_prod = get_product_list(last_id, client_id, seller_token)
-        product_list.extend(some_prod.get("items"))
+    next_page = asyncio.create_task(get_product_list(client, ""))
+    while next_page:
+        some_prod = await next_page
+        items = some_prod.get("items")
         total = some_prod.get("total")
         last_id = some_prod.get("last_id")
-        if total == len(product_list):
-            break
+        next_page = None
+        if items and total > len(product_list) + len(items):
+            next_page = asyncio.create_task(get_product_list(client, last_id))
+        product_list.extend(items)
     offer_ids = []
     for product in product_list:
         offer_ids.append(product.get("offer_id"))
     return offer_ids
 
 
-def update_price(prices: list, client_id, seller_token):
+async def update_price(client, prices: list):
     """Обновляет цены товаров на Ozon через API.
 
     Отправляет список цен на сервер Ozon для обновления.
 
     Args:
+        client (OzonClient): Клиент API Ozon.
         prices (list): Список словарей с данными о ценах,
             где каждый словарь содержит ключи:
             "offer_id",
@@ -104,107 +399,102 @@ def update_price(prices: list, client_id, seller_token):
             "old_price",
             "currency_code",
             "auto_action_enabled".
-        client_id (str): Идентификатор клиента Ozon.
-        seller_token (str): Токен API Ozon.
 
     Returns:
         dict: Ответ API в формате JSON.
 
     Raises:
-        requests.exceptions.HTTPError: Если запрос к API завершился ошибкой.
+        aiohttp.ClientResponseError: Если запрос к API завершился ошибкой.
 
     Examples:
-        >>> update_price([{"offer_id": "ABC123",
-        ...                "price": "5990",
-        ...                "old_price": "0",
-        ...                "currency_code": "RUB",
-        ...                "auto_action_enabled": "UNKNOWN"}],
-        ...              "12345", "token123")
+        >>> await update_price(client,
+        ...                    [{"offer_id": "ABC123",
+        ...                      "price": "5990",
+        ...                      "old_price": "0",
+        ...                      "currency_code": "RUB",
+        ...                      "auto_action_enabled": "UNKNOWN"}])
         {'result': [{'offer_id': 'ABC123', 'updated': True}, ...]}
-        >>> update_price([], "12345", "token123")
+        >>> await update_price(client, [])
         {'result': []}
     """
-    url = "https://api-seller.ozon.ru/v1/product/import/prices"
-    headers = {
-        "Client-Id": client_id,
-        "Api-Key": seller_token,
-    }
+    url = OZON_API_URL + "v1/product/import/prices"
     payload = {"prices": prices}
-    response = requests.post(url, json=payload, headers=headers)
-    response.raise_for_status()
-    return response.json()
+    return await request_json(
+        client.session, "POST", url, json=payload, headers=client.headers,
+        limiter=client.limiter,
+    )
 
 
-def update_stocks(stocks: list, client_id, seller_token):
+async def update_stocks(client, stocks: list):
     """Обновляет остатки товаров на Ozon через API.
 
     Отправляет список остатков на сервер Ozon для обновления.
 
     Args:
+        client (OzonClient): Клиент API Ozon.
         stocks (list): Список словарей с данными об остатках,
             где каждый словарь содержит ключи:
                 "offer_id" (str): Артикул товара,
                 "stock" (int): Количество на складе.
-        client_id (str): Идентификатор клиента Ozon.
-        seller_token (str): Токен API Ozon.
 
     Returns:
         dict: Ответ API в формате JSON.
 
     Raises:
-        requests.exceptions.HTTPError: Если запрос к API завершился ошибкой.
+        aiohttp.ClientResponseError: Если запрос к API завершился ошибкой.
 
     Examples:
-        >>> update_stocks([{"offer_id": "ABC123", "stock": 10}],
-        ...               "12345", "token123")
+        >>> await update_stocks(client, [{"offer_id": "ABC123", "stock": 10}])
         {'result': [{'offer_id': 'ABC123', 'updated': True}, ...]}
-        >>> update_stocks([], "12345", "token123")
+        >>> await update_stocks(client, [])
         {'result': []}
     """
-    url = "https://api-seller.ozon.ru/v1/product/import/stocks"
-    headers = {
-        "Client-Id": client_id,
-        "Api-Key": seller_token,
-    }
+    url = OZON_API_URL + "v1/product/import/stocks"
     payload = {"stocks": stocks}
-    response = requests.post(url, json=payload, headers=headers)
-    response.raise_for_status()
-    return response.json()
+    return await request_json(
+        client.session, "POST", url, json=payload, headers=client.headers,
+        limiter=client.limiter,
+    )
 
 
 def download_stock():
     """Скачивает и обрабатывает файл остатков с сайта Casio.
 
-    Загружает ZIP-архив с сайта, извлекает файл Excel,
-    читает данные о часах и возвращает их в виде списка словарей.
-    После обработки файл удаляется.
+    Загружает ZIP-архив с сайта в память, читает из него файл Excel
+    с данными о часах и возвращает их в виде таблицы.
+    Коды и количество читаются сразу как строки.
+    Файлы на диск не записываются.
 
     Returns:
-        list: Список словарей с данными об остатках часов
-            (ключи: "Код", "Количество", "Цена" и др.).
+        pandas.DataFrame: Таблица с данными об остатках часов
+            (столбцы: "Код", "Количество", "Цена" и др.).
 
     Raises:
         requests.exceptions.RequestException: Если загрузка с сайта не удалась.
-        OSError: Если возникла ошибка при работе с файлами.
+        zipfile.BadZipFile: Если скачанный файл не является ZIP-архивом.
 
     Examples:
         >>> download_stock()
-        [{'Код': 'ABC123', 'Количество': '5', 'Цена': "5'990.00 руб."}, ...]
+                Код Количество           Цена
+        0    ABC123          5  5'990.00 руб.
+        ...
     """
     casio_url = "https://timeworld.ru/upload/files/ostatki.zip"
     session = requests.Session()
-    response = session.get(casio_url)
-    response.raise_for_status()
-    with response, zipfile.ZipFile(io.BytesIO(response.content)) as archive:
-        archive.extractall(".")
-    excel_file = "ostatki.xls"
-    watch_remnants = pd.read_excel(
-        io=excel_file,
-        na_values=None,
-        keep_default_na=False,
-        header=17,
-    ).to_dict(orient="records")
-    os.remove("./ostatki.xls")
+    buffer = io.BytesIO()
+    with session.get(casio_url, stream=True) as response:
+        response.raise_for_status()
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            buffer.write(chunk)
+    with zipfile.ZipFile(buffer) as archive:
+        with archive.open("ostatki.xls") as excel_file:
+            watch_remnants = pd.read_excel(
+                io=excel_file,
+                na_values=None,
+                keep_default_na=False,
+                header=17,
+                dtype={"Код": str, "Количество": str},
+            )
     return watch_remnants
 
 
@@ -216,37 +506,40 @@ def create_stocks(watch_remnants, offer_ids):
     и добавляет нулевые остатки для отсутствующих товаров.
 
     Args:
-        watch_remnants (list): Список словарей с данными об остатках с Casio,
-            где каждый словарь содержит "Код" и "Количество".
+        watch_remnants (pandas.DataFrame): Таблица остатков с Casio
+            со столбцами "Код" и "Количество".
         offer_ids (list): Список строк с артикулами товаров с Ozon.
 
     Returns:
-        list: Список словарей с остатками в формате
-            {"offer_id": str, "stock": int}.
+        tuple: Кортеж из двух списков словарей с остатками в формате
+            {"offer_id": str, "stock": int}: все остатки и ненулевые остатки.
 
     Examples:
-        >>> create_stocks([{"Код": "ABC123", "Количество": "5"}],
+        >>> create_stocks(pd.DataFrame([{"Код": "ABC123", "Количество": "5"}]),
         ...               ["ABC123", "XYZ789"])
-        [{'offer_id': 'ABC123', 'stock': 5},
-        {'offer_id': 'XYZ789', 'stock': 0}]
-        >>> create_stocks([], ["ABC123"])
-        [{'offer_id': 'ABC123', 'stock': 0}]
+        ([{'offer_id': 'ABC123', 'stock': 5},
+          {'offer_id': 'XYZ789', 'stock': 0}],
+         [{'offer_id': 'ABC123', 'stock': 5}])
+        >>> create_stocks(pd.DataFrame(columns=["Код", "Количество"]),
+        ...               ["ABC123"])
+        ([{'offer_id': 'ABC123', 'stock': 0}], [])
     """
     stocks = []
-    for watch in watch_remnants:
-        if str(watch.get("Код")) in offer_ids:
-            count = str(watch.get("Количество"))
-            if count == ">10":
-                stock = 100
-            elif count == "1":
-                stock = 0
-            else:
-                stock = int(watch.get("Количество"))
-            stocks.append({"offer_id": str(watch.get("Код")), "stock": stock})
-            offer_ids.remove(str(watch.get("Код")))
-    for offer_id in offer_ids:
+    not_empty = []
+    remaining = set(offer_ids)
+    codes = watch_remnants["Код"]
+    matched = codes.isin(remaining) & ~codes.duplicated()
+    counts = stock_conversion(
+        watch_remnants.loc[matched, "Количество"], codes[matched]
+    )
+    for code, stock in zip(codes[matched].tolist(), counts.tolist()):
+        record = {"offer_id": code, "stock": stock}
+        stocks.append(record)
+        if stock != 0:
+            not_empty.append(record)
+    for offer_id in remaining.difference(codes[matched]):
         stocks.append({"offer_id": offer_id, "stock": 0})
-    return stocks
+    return stocks, not_empty
 
 
 def create_prices(watch_remnants, offer_ids):
@@ -256,8 +549,8 @@ def create_prices(watch_remnants, offer_ids):
     фильтруя по артикулам Ozon.
 
     Args:
-        watch_remnants (list): Список словарей с данными об остатках с Casio,
-            где каждый словарь содержит "Код" и "Цена".
+        watch_remnants (pandas.DataFrame): Таблица остатков с Casio
+            со столбцами "Код" и "Цена".
         offer_ids (list): Список строк с артикулами товаров с Ozon.
 
     Returns:
@@ -266,48 +559,91 @@ def create_prices(watch_remnants, offer_ids):
              "currency_code": str, "auto_action_enabled": str}.
 
     Examples:
-        >>> create_prices([{"Код": "ABC123", "Цена": "5'990.00 руб."}],
+        >>> create_prices(pd.DataFrame([{"Код": "ABC123",
+        ...                              "Цена": "5'990.00 руб."}]),
         ...               ["ABC123"])
         [{'auto_action_enabled': 'UNKNOWN', 'currency_code': 'RUB',
           'offer_id': 'ABC123', 'old_price': '0', 'price': '5990'}]
-        >>> create_prices([], ["ABC123"])
+        >>> create_prices(pd.DataFrame(columns=["Код", "Цена"]), ["ABC123"])
         []
     """
-    prices = []
-    for watch in watch_remnants:
-        if str(watch.get("Код")) in offer_ids:
-            price = {
-                "auto_action_enabled": "UNKNOWN",
-                "currency_code": "RUB",
-                "offer_id": str(watch.get("Код")),
-                "old_price": "0",
-                "price": price_conversion(watch.get("Цена")),
-            }
-            prices.append(price)
-    return prices
+    codes = watch_remnants["Код"]
+    matched = codes.isin(set(offer_ids))
+    return [
+        {
+            "auto_action_enabled": "UNKNOWN",
+            "currency_code": "RUB",
+            "offer_id": code,
+            "old_price": "0",
+            "price": price,
+        }
+        for code, price in zip(
+            codes[matched].tolist(),
+            prices_conversion(watch_remnants.loc[matched, "Цена"]).tolist(),
+        )
+    ]
+
+
+def stock_conversion(quantities: pd.Series, codes=None) -> np.ndarray:
+    """Преобразует столбец количества товара в остатки для загрузки.
+
+    Значения из STOCK_OVERRIDES (">10" - 100, "1" - 0) заменяются
+    по таблице, остальные приводятся к целому числу, а нечисловые
+    и дробные считаются нулем. О таких непустых значениях пишется
+    предупреждение в лог, так как нулевой остаток снимает товар
+    с продажи.
 
+    Args:
+        quantities (pandas.Series): Столбец "Количество" из файла
+            остатков со значениями-строками (см. download_stock).
+        codes (pandas.Series, optional): Коды товаров с тем же индексом
+            для предупреждения. Если не переданы, указывается индекс.
 
-def price_conversion(price: str) -> str:
-    """Преобразует строковое представление цены в числовой формат для загрузки.
+    Returns:
+        numpy.ndarray: Массив целых остатков той же длины.
 
-    Убирает все символы, кроме цифр, из строки с ценой
-    и возвращает целую часть.
+    Examples:
+        >>> stock_conversion(pd.Series([">10", "1", "5", "7"]))
+        array([100,   0,   5,   7])
+        >>> stock_conversion(pd.Series(["5", "нет", "2.7"]),
+        ...                  pd.Series(["ABC123", "DEF456", "GHI789"]))
+        WARNING:...:Количество не целое число, остаток считается нулем:
+        {'DEF456': 'нет', 'GHI789': '2.7'}
+        array([5, 0, 0])
+    """
+    overrides = quantities.map(STOCK_OVERRIDES)
+    numbers = pd.to_numeric(quantities, errors="coerce")
+    numbers = numbers.where(numbers % 1 == 0)
+    invalid = (
+        numbers.isna() & overrides.isna()
+        & quantities.notna() & quantities.ne("")
+    )
+    if invalid.any():
+        labels = quantities.index if codes is None else codes
+        logger.warning(
+            "Количество не целое число, остаток считается нулем: %s",
+            dict(zip(labels[invalid], quantities[invalid])),
+        )
+    return overrides.fillna(numbers.fillna(0)).astype(int).to_numpy()
+
+
+def prices_conversion(prices: pd.Series) -> pd.Series:
+    """Преобразует столбец цен в числовой формат для загрузки.
+
+    Из каждой цены убираются дробная часть и все символы, кроме цифр,
+    за один проход по столбцу.
 
     Args:
-        price (str): Строка с ценой, например, "5'990.00 руб." или "1234.50".
+        prices (pandas.Series): Столбец "Цена" из файла остатков.
 
     Returns:
-        str: Целая часть цены в виде строки, содержащей только цифры.
+        pandas.Series: Целые части цен в виде строк из цифр.
 
     Examples:
-        >>> price_conversion("5'990.00 руб.")
-        '5990'
-        >>> price_conversion("1234.50")
-        '1234'
-        >>> price_conversion("")
-        ''
+        >>> prices_conversion(pd.Series(["5'990.00 руб.", "1234.50"])).tolist()
+        ['5990', '1234']
     """
-    return re.sub("[^0-9]", "", price.split(".")[0])
+    return prices.astype(str).str.replace(PRICE_JUNK_RE, "", regex=True)
 
 
 def divide(lst: list, n: int):
@@ -332,69 +668,115 @@ def divide(lst: list, n: int):
         yield lst[i: i + n]
 
 
-async def upload_prices(watch_remnants, client_id, seller_token):
+async def upload_prices(client, watch_remnants, offer_ids=None):
     """Загружает цены на Ozon асинхронно.
 
-    Получает артикулы, формирует цены и отправляет их частями по 1000 записей.
+    Получает артикулы, формирует цены в отдельном потоке, чтобы
+    не блокировать другие запросы, и отправляет их частями
+    по PRICES_BATCH_SIZE (1000) записей. Одновременно выполняется
+    не более MAX_CONCURRENT_REQUESTS запросов клиента.
 
     Args:
-        watch_remnants (list): Список словарей с данными об остатках с Casio.
-        client_id (str): Идентификатор клиента Ozon.
-        seller_token (str): Токен API Ozon.
+        client (OzonClient): Клиент API Ozon.
+        watch_remnants (pandas.DataFrame): Таблица остатков с Casio.
+        offer_ids (list, optional): Артикулы товаров с Ozon.
+            Если не переданы, запрашиваются у API.
 
     Returns:
         list: Список сформированных цен.
 
     Raises:
-        requests.exceptions.HTTPError: Если запрос к API завершился ошибкой.
+        aiohttp.ClientResponseError: Если запрос к API завершился ошибкой.
 
     Examples:
-        >>> await upload_prices([{"Код": "ABC123", "Цена": "5'990.00 руб."}],
-        ...                     "12345", "token123")
+        >>> await upload_prices(client,
+        ...                     pd.DataFrame([{"Код": "ABC123",
+        ...                                    "Цена": "5'990.00 руб."}]))
         [{'offer_id': 'ABC123', 'price': '5990', ...}]
-        >>> await upload_prices([], "12345", "token123")
+        >>> await upload_prices(client, pd.DataFrame(columns=["Код", "Цена"]))
         []
     """
-    offer_ids = get_offer_ids(client_id, seller_token)
-    prices = create_prices(watch_remnants, offer_ids)
-    for some_price in list(divide(prices, 1000)):
-        update_price(some_price, client_id, seller_token)
+    if offer_ids is None:
+        offer_ids = await get_offer_ids(client)
+    prices = await asyncio.to_thread(
+        create_prices, watch_remnants, offer_ids
+    )
+    await gather_with_limit(
+        update_price(client, some_price)
+        for some_price in divide(prices, PRICES_BATCH_SIZE)
+    )
     return prices
 
 
-async def upload_stocks(watch_remnants, client_id, seller_token):
+async def upload_stocks(client, watch_remnants, offer_ids=None):
     """Загружает остатки на Ozon асинхронно.
 
-    Получает артикулы, формирует остатки, отправляет их частями по 100 записей
-    и возвращает ненулевые остатки и полный список.
+    Получает артикулы, формирует остатки в отдельном потоке, чтобы
+    не блокировать другие запросы, отправляет их частями
+    по STOCKS_BATCH_SIZE (100) записей и возвращает ненулевые остатки
+    и полный список. Одновременно выполняется не более
+    MAX_CONCURRENT_REQUESTS запросов клиента.
 
     Args:
-        watch_remnants (list): Список словарей с данными об остатках с Casio.
-        client_id (str): Идентификатор клиента Ozon.
-        seller_token (str): Токен API Ozon.
+        client (OzonClient): Клиент API Ozon.
+        watch_remnants (pandas.DataFrame): Таблица остатков с Casio.
+        offer_ids (list, optional): Артикулы товаров с Ozon.
+            Если не переданы, запрашиваются у API.
 
     Returns:
         tuple: Кортеж из двух списков: ненулевые остатки и все остатки.
 
     Raises:
-        requests.exceptions.HTTPError: Если запрос к API завершился ошибкой.
+        aiohttp.ClientResponseError: Если запрос к API завершился ошибкой.
 
     Examples:
-        >>> await upload_stocks([{"Код": "ABC123", "Количество": "5"}],
-        ...                     "12345", "token123")
+        >>> await upload_stocks(client,
+        ...                     pd.DataFrame([{"Код": "ABC123",
+        ...                                    "Количество": "5"}]))
         ([{'offer_id': 'ABC123', 'stock': 5}],
          [{'offer_id': 'ABC123', 'stock': 5}])
-        >>> await upload_stocks([], "12345", "token123")
+        >>> await upload_stocks(client,
+        ...                     pd.DataFrame(columns=["Код", "Количество"]))
         ([], [])
     """
-    offer_ids = get_offer_ids(client_id, seller_token)
-    stocks = create_stocks(watch_remnants, offer_ids)
-    for some_stock in list(divide(stocks, 100)):
-        update_stocks(some_stock, client_id, seller_token)
-    not_empty = list(filter(lambda stock: (stock.get("stock") != 0), stocks))
+    if offer_ids is None:
+        offer_ids = await get_offer_ids(client)
+    stocks, not_empty = await asyncio.to_thread(
+        create_stocks, watch_remnants, offer_ids
+    )
+    await gather_with_limit(
+        update_stocks(client, some_stock)
+        for some_stock in divide(stocks, STOCKS_BATCH_SIZE)
+    )
     return not_empty, stocks
 
 
+async def update_shop(client_id, seller_token):
+    """Обновляет остатки и цены магазина Ozon в одной HTTP-сессии.
+
+    Артикулы запрашиваются один раз, пока в отдельном потоке скачивается
+    файл остатков, после чего остатки и цены отправляются одновременно.
+
+    Args:
+        client_id (str): Идентификатор клиента Ozon.
+        seller_token (str): Токен API Ozon.
+
+    Raises:
+        aiohttp.ClientResponseError: Если запрос к API завершился ошибкой.
+        requests.exceptions.RequestException: Если загрузка с сайта не удалась.
+    """
+    async with create_session() as session:
+        client = OzonClient(session, client_id, seller_token)
+        watch_remnants, offer_ids = await gather_or_cancel(
+            asyncio.to_thread(download_stock),
+            get_offer_ids(client),
+        )
+        await gather_or_cancel(
+            upload_stocks(client, watch_remnants, offer_ids),
+            upload_prices(client, watch_remnants, offer_ids),
+        )
+
+
 def main():
     """Основная функция для запуска обновления цен и остатков на Ozon.
 
@@ -403,23 +785,20 @@ def main():
     Raises:
         requests.exceptions.ReadTimeout: Если превышено время ожидания запроса.
         requests.exceptions.ConnectionError: При ошибке соединения с API.
+        aiohttp.ClientConnectionError: При ошибке соединения с API.
         Exception: При прочих ошибках выполнения.
     """
     env = Env()
     seller_token = env.str("SELLER_TOKEN")
     client_id = env.str("CLIENT_ID")
     try:
-        offer_ids = get_offer_ids(client_id, seller_token)
-        watch_remnants = download_stock()
-        stocks = create_stocks(watch_remnants, offer_ids)
-        for some_stock in list(divide(stocks, 100)):
-            update_stocks(some_stock, client_id, seller_token)
-        prices = create_prices(watch_remnants, offer_ids)
-        for some_price in list(divide(prices, 900)):
-            update_price(some_price, client_id, seller_token)
-    except requests.exceptions.ReadTimeout:
+        asyncio.run(update_shop(client_id, seller_token))
+    except (requests.exceptions.ReadTimeout, asyncio.TimeoutError):
         print("Превышено время ожидания...")
-    except requests.exceptions.ConnectionError as error:
+    except (
+        requests.exceptions.ConnectionError,
+        aiohttp.ClientConnectionError,
+    ) as error:
         print(error, "Ошибка соединения")
     except Exception as error:
         print(error, "ERROR_2")